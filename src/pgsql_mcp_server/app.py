@@ -1,20 +1,749 @@
+import asyncio
+import decimal
+import functools
+import importlib.util
 import os
+import re
+import time
 from contextlib import asynccontextmanager
-from dataclasses import dataclass
-from typing import Any, AsyncIterator, Optional, cast
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional, Sequence
 
+import anyio
+import asyncpg
 import click
+import orjson
 from mcp.server.fastmcp import Context, FastMCP
-from sqlalchemy import Result, inspect
-from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy import TextClause
+from sqlalchemy.exc import DBAPIError, SQLAlchemyError
+from sqlalchemy.ext.asyncio import (
+    AsyncConnection,
+    AsyncEngine,
+    create_async_engine,
+)
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlmodel import text
-from tabulate import tabulate
+
+POOL_SIZE = int(os.getenv("PG_POOL_SIZE", "10"))
+POOL_MAX_OVERFLOW = int(os.getenv("PG_POOL_MAX_OVERFLOW", "20"))
+POOL_RECYCLE = int(os.getenv("PG_POOL_RECYCLE", "1800"))
+POOL_TIMEOUT = float(os.getenv("PG_POOL_TIMEOUT", "10"))
+POOL_MIN_SIZE = int(os.getenv("PG_POOL_MIN_SIZE", "2"))
+MAX_ROWS = int(os.getenv("MCP_MAX_ROWS", "1000"))
+MAX_OUTPUT_BYTES = int(os.getenv("MCP_MAX_BYTES", str(1024 * 1024)))
+OUTPUT_FORMAT = os.getenv("MCP_OUTPUT", "table").lower()
+MAX_CACHED_SQL_BYTES = 4096
+MAX_QUERY_COST = float(os.getenv("MCP_MAX_QUERY_COST", "100000"))
+COMMAND_TIMEOUT = float(os.getenv("PG_COMMAND_TIMEOUT", "30"))
+STATEMENT_TIMEOUT_MS = int(os.getenv("PG_STATEMENT_TIMEOUT", "30000"))
+# Seconds the client-side timeout waits beyond the server's statement_timeout,
+# so PostgreSQL cancels a slow statement before asyncpg gives up on it.
+CLIENT_TIMEOUT_MARGIN = 5
+IDLE_IN_TRANSACTION_TIMEOUT_MS = int(
+    os.getenv("PG_IDLE_IN_TRANSACTION_TIMEOUT", "60000")
+)
+READ_ONLY = os.getenv("PG_READ_ONLY", "").lower() in ("1", "true", "yes", "on")
+METADATA_CACHE_TTL = float(os.getenv("PG_METADATA_CACHE_TTL", "60"))
+
+_SCHEMA_CHANGE_RE = re.compile(
+    r"\b(CREATE|ALTER|DROP|TRUNCATE|COMMENT)\b", re.IGNORECASE
+)
+
+_ERR_QUERY = "Error occurred while querying table: {}"
+_ERR_EXECUTE = "Error occurred while executing {} query: {}"
+_ERR_UNEXPECTED = "Unexpected error occurred while executing {} query: {}"
+_ERR_READ_ONLY = "{} queries are disabled: the server is running in read-only mode."
+_ERR_TIMEOUT = "Query cancelled: it exceeded the statement timeout of {} ms."
+_ERR_TIMEOUT_MS = "timeout_ms must be zero or a positive number of milliseconds."
+_ERR_CLIENT_TIMEOUT = "Query timed out after {:g} s without a response from the server."
+_NO_SCHEMAS = "No schemas found."
+_NO_TABLES = "No tables found in schema {}."
+_NO_COLUMNS = "No columns found in table."
+_NO_INDEXES = "No indexes found in table."
+_NO_FOREIGN_KEYS = "No foreign keys found in table {}."
+_NO_RESULTS = "Query returned no results."
+
+_HDR_COLUMNS = ("Name", "Type", "Nullable", "Autoincrement", "Default", "Comment")
+_HDR_INDEXES = ("Name", "Column Names", "Unique")
+_HDR_FOREIGN_KEYS = (
+    "Name",
+    "Constrained Columns",
+    "Referred Schema",
+    "Referred Table",
+    "Referred Columns",
+)
+_HDR_SCHEMA_SUMMARY = ("Table", "Estimated Rows", "Total Size", "Columns")
+
+_DSN_SCHEME_RE = re.compile(r"^([A-Za-z][A-Za-z0-9+.-]*)://")
+_SELECT_RE = re.compile(r"^\s*(SELECT|WITH)\b", re.IGNORECASE)
+_UNWRAPPABLE_RE = re.compile(
+    r"\b(LIMIT|FETCH|INTO|INSERT|UPDATE|DELETE|MERGE)\b", re.IGNORECASE
+)
+
+# set_config(..., true) is SET LOCAL with a bind, so each value does not become
+# a distinct statement in the caches.
+_SET_STATEMENT_TIMEOUT = text("SELECT set_config('statement_timeout', :ms, true)")
+
+_SCHEMAS_QUERY = text(
+    """
+    SELECT nspname
+    FROM pg_namespace
+    WHERE nspname NOT LIKE 'pg\\_%'
+    ORDER BY nspname
+    """
+)
+_TABLES_QUERY = text(
+    """
+    SELECT c.relname
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = :schema AND c.relkind IN ('r', 'p')
+    ORDER BY c.relname
+    """
+)
+_COLUMNS_QUERY = text(
+    """
+    SELECT a.attname AS name,
+           format_type(a.atttypid, a.atttypmod) AS type,
+           NOT a.attnotnull AS nullable,
+           pg_get_expr(d.adbin, d.adrelid) AS default,
+           a.attidentity <> ''
+               OR coalesce(pg_get_expr(d.adbin, d.adrelid), '')
+                  LIKE 'nextval(%' AS autoincrement,
+           col_description(a.attrelid, a.attnum) AS comment
+    FROM pg_attribute a
+    LEFT JOIN pg_attrdef d
+           ON d.adrelid = a.attrelid AND d.adnum = a.attnum
+    WHERE a.attrelid =
+          (quote_ident(:schema) || '.' || quote_ident(:table))::regclass
+      AND a.attnum > 0
+      AND NOT a.attisdropped
+    ORDER BY a.attnum
+    """
+)
+_INDEXES_QUERY = text(
+    """
+    SELECT i.relname AS name,
+           ARRAY(
+               SELECT pg_get_indexdef(ix.indexrelid, k, true)
+               FROM generate_series(1, ix.indnkeyatts) AS k
+               ORDER BY k
+           ) AS column_names,
+           ix.indisunique AS unique
+    FROM pg_index ix
+    JOIN pg_class i ON i.oid = ix.indexrelid
+    WHERE ix.indrelid =
+          (quote_ident(:schema) || '.' || quote_ident(:table))::regclass
+      AND NOT ix.indisprimary
+    ORDER BY i.relname
+    """
+)
+_FOREIGN_KEYS_QUERY = text(
+    """
+    SELECT c.conname AS name,
+           ARRAY(
+               SELECT a.attname
+               FROM unnest(c.conkey) WITH ORDINALITY AS k(attnum, n)
+               JOIN pg_attribute a
+                    ON a.attrelid = c.conrelid AND a.attnum = k.attnum
+               ORDER BY k.n
+           ) AS constrained_columns,
+           rn.nspname AS referred_schema,
+           rc.relname AS referred_table,
+           ARRAY(
+               SELECT a.attname
+               FROM unnest(c.confkey) WITH ORDINALITY AS k(attnum, n)
+               JOIN pg_attribute a
+                    ON a.attrelid = c.confrelid AND a.attnum = k.attnum
+               ORDER BY k.n
+           ) AS referred_columns
+    FROM pg_constraint c
+    JOIN pg_class rc ON rc.oid = c.confrelid
+    JOIN pg_namespace rn ON rn.oid = rc.relnamespace
+    WHERE c.contype = 'f'
+      AND c.conrelid =
+          (quote_ident(:schema) || '.' || quote_ident(:table))::regclass
+    ORDER BY c.conname
+    """
+)
+_PRIMARY_KEY_QUERY = text(
+    """
+    SELECT c.conname AS name,
+           ARRAY(
+               SELECT a.attname
+               FROM unnest(c.conkey) WITH ORDINALITY AS k(attnum, n)
+               JOIN pg_attribute a
+                    ON a.attrelid = c.conrelid AND a.attnum = k.attnum
+               ORDER BY k.n
+           ) AS constrained_columns
+    FROM pg_constraint c
+    WHERE c.contype = 'p'
+      AND c.conrelid =
+          (quote_ident(:schema) || '.' || quote_ident(:table))::regclass
+    """
+)
+_TABLE_COMMENT_QUERY = text(
+    """
+    SELECT obj_description(
+        (quote_ident(:schema) || '.' || quote_ident(:table))::regclass,
+        'pg_class'
+    )
+    """
+)
+_SCHEMA_SUMMARY_QUERY = text(
+    """
+    SELECT c.relname,
+           NULLIF(c.reltuples, -1)::bigint,
+           pg_size_pretty(pg_total_relation_size(c.oid)),
+           (SELECT count(*)
+            FROM pg_attribute a
+            WHERE a.attrelid = c.oid
+              AND a.attnum > 0
+              AND NOT a.attisdropped)
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = :schema AND c.relkind IN ('r', 'p')
+    ORDER BY c.relname
+    """
+)
+
+
+@dataclass
+class MetadataCache:
+    """In-process cache for reflected schema metadata.
+
+    Entries expire after ``ttl`` seconds; a ``ttl`` of 0 disables caching.
+    Expired entries are dropped when looked up and whenever a new entry is
+    stored, so keys that are never asked for again don't accumulate.
+    Concurrent misses on the same key share a single catalog lookup.
+    """
+
+    ttl: float = METADATA_CACHE_TTL
+    entries: dict[tuple, tuple[float, Any]] = field(default_factory=dict)
+    locks: dict[tuple, asyncio.Lock] = field(default_factory=dict)
+    generation: int = 0
+
+    def _lookup(self, key: tuple) -> tuple[bool, Any]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return False, None
+        if time.monotonic() - entry[0] < self.ttl:
+            return True, entry[1]
+        del self.entries[key]
+        return False, None
+
+    def _store(self, key: tuple, value: Any) -> None:
+        now = time.monotonic()
+        expired = [k for k, (at, _) in self.entries.items() if now - at >= self.ttl]
+        for k in expired:
+            del self.entries[k]
+        self.entries[key] = (now, value)
+
+    async def get_or_load(
+        self, key: tuple, loader: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        hit, value = self._lookup(key)
+        if hit:
+            return value
+        lock = self.locks.setdefault(key, asyncio.Lock())
+        try:
+            async with lock:
+                hit, value = self._lookup(key)
+                if hit:
+                    return value
+                generation = self.generation
+                value = await loader()
+                # Don't store a result that an invalidation raced with.
+                if self.ttl > 0 and generation == self.generation:
+                    self._store(key, value)
+                return value
+        finally:
+            # Callers already waiting keep their reference to this lock and
+            # find the stored entry; later misses start a fresh lock.
+            if self.locks.get(key) is lock:
+                del self.locks[key]
+
+    def clear(self, schema: Optional[str] = None) -> None:
+        """Drop every entry, or only the entries of one schema."""
+        self.generation += 1
+        if schema is None:
+            self.entries.clear()
+            self.locks.clear()
+        else:
+            for key in [k for k in self.entries if k[1:2] == (schema,)]:
+                del self.entries[key]
 
 
 @dataclass
 class AppContext:
     engine: AsyncEngine
+    metadata_cache: MetadataCache = field(default_factory=MetadataCache)
+
+
+async def _pg_schemas(connection: AsyncConnection) -> list[str]:
+    result = await connection.execute(_SCHEMAS_QUERY)
+    return list(result.scalars())
+
+
+async def _pg_tables(connection: AsyncConnection, schema: str) -> list[str]:
+    result = await connection.execute(_TABLES_QUERY, {"schema": schema})
+    return list(result.scalars())
+
+
+async def _pg_columns(
+    connection: AsyncConnection, schema: str, table: str
+) -> list[dict[str, Any]]:
+    result = await connection.execute(
+        _COLUMNS_QUERY, {"schema": schema, "table": table}
+    )
+    return [dict(row) for row in result.mappings()]
+
+
+async def _pg_indexes(
+    connection: AsyncConnection, schema: str, table: str
+) -> list[dict[str, Any]]:
+    result = await connection.execute(
+        _INDEXES_QUERY, {"schema": schema, "table": table}
+    )
+    return [dict(row) for row in result.mappings()]
+
+
+async def _pg_foreign_keys(
+    connection: AsyncConnection, schema: str, table: str
+) -> list[dict[str, Any]]:
+    result = await connection.execute(
+        _FOREIGN_KEYS_QUERY, {"schema": schema, "table": table}
+    )
+    return [dict(row) for row in result.mappings()]
+
+
+async def _pg_primary_key(
+    connection: AsyncConnection, schema: str, table: str
+) -> dict[str, Any]:
+    result = await connection.execute(
+        _PRIMARY_KEY_QUERY, {"schema": schema, "table": table}
+    )
+    row = result.mappings().first()
+    return dict(row) if row else {"name": None, "constrained_columns": []}
+
+
+async def _pg_table_comment(
+    connection: AsyncConnection, schema: str, table: str
+) -> dict[str, Any]:
+    result = await connection.execute(
+        _TABLE_COMMENT_QUERY, {"schema": schema, "table": table}
+    )
+    return {"text": result.scalar()}
+
+
+@asynccontextmanager
+async def _catalog_connection(engine: AsyncEngine) -> AsyncIterator[AsyncConnection]:
+    """Check out a connection for pg_catalog reads.
+
+    Autocommit drops the BEGIN/ROLLBACK pair SQLAlchemy would otherwise wrap
+    around each lookup; the catalog queries only read, so nothing needs a
+    transaction.
+    """
+    async with engine.connect() as connection:
+        await connection.execution_options(isolation_level="AUTOCOMMIT")
+        yield connection
+
+
+async def _fetch(
+    engine: AsyncEngine, fn: Callable[..., Awaitable[Any]], *args: Any
+) -> Any:
+    """Run a pg_catalog helper on a fresh connection."""
+    async with _catalog_connection(engine) as connection:
+        return await fn(connection, *args)
+
+
+async def _fetch_table_description(
+    engine: AsyncEngine, schema: str, table: str
+) -> dict[str, Any]:
+    """Fetch everything describe_table shows on a single connection checkout."""
+    async with _catalog_connection(engine) as connection:
+        return {
+            "columns": await _pg_columns(connection, schema, table),
+            "indexes": await _pg_indexes(connection, schema, table),
+            "foreign_keys": await _pg_foreign_keys(connection, schema, table),
+            "primary_key": await _pg_primary_key(connection, schema, table),
+            "comment": await _pg_table_comment(connection, schema, table),
+        }
+
+
+@functools.lru_cache(maxsize=256)
+def _text_clause(sql: str) -> TextClause:
+    return text(sql)
+
+
+def _cached_text(sql: str) -> TextClause:
+    """Return a reusable ``text()`` clause for ``sql``.
+
+    Reusing the clause lets the engine's compiled cache skip recompiling
+    repeated statements. Statements over MAX_CACHED_SQL_BYTES are not kept.
+    """
+    if len(sql) > MAX_CACHED_SQL_BYTES:
+        return text(sql)
+    return _text_clause(sql)
+
+
+async def _bounded_select(connection: AsyncConnection, sql: str) -> str:
+    """Cap an expensive, unbounded SELECT with a LIMIT.
+
+    The planner's estimated total cost is checked with ``EXPLAIN`` first; only
+    queries above MAX_QUERY_COST are rewritten, everything else runs as given.
+    """
+    if MAX_QUERY_COST <= 0 or not _SELECT_RE.match(sql) or _UNWRAPPABLE_RE.search(sql):
+        return sql
+    sql = sql.strip().rstrip(";")
+    # Sent as-is: text() would read ":name" inside string literals as binds.
+    explain = f"EXPLAIN (FORMAT JSON) {sql}"
+    plan = (await connection.exec_driver_sql(explain)).scalar()
+    if plan[0]["Plan"]["Total Cost"] <= MAX_QUERY_COST:
+        return sql
+    return f"SELECT * FROM (\n{sql}\n) AS _bounded LIMIT {MAX_ROWS + 1}"
+
+
+def _client_timeout(statement_timeout_ms: int) -> Optional[float]:
+    """asyncpg timeout for a statement under ``statement_timeout_ms``.
+
+    PG_COMMAND_TIMEOUT is a floor; the result always leaves
+    CLIENT_TIMEOUT_MARGIN seconds for the server-side timeout to fire first.
+    """
+    if statement_timeout_ms <= 0:
+        return COMMAND_TIMEOUT or None
+    return max(COMMAND_TIMEOUT, statement_timeout_ms / 1000 + CLIENT_TIMEOUT_MARGIN)
+
+
+async def _fetch_records(
+    connection: AsyncConnection, sql: str, timeout: Optional[float]
+) -> tuple[Sequence[str], list[Any]]:
+    """Fetch up to MAX_ROWS + 1 asyncpg records, bypassing SQLAlchemy rows.
+
+    Records index positionally like tuples, so they go straight to the
+    renderers. The cursor keeps the fetch bounded; asyncpg cursors need a
+    transaction, which is a savepoint if SQLAlchemy already opened one. It is
+    always rolled back, so nothing the statement does is ever committed.
+    """
+    raw = await connection.get_raw_connection()
+    driver = raw.driver_connection
+    transaction = driver.transaction()
+    await transaction.start()
+    try:
+        cursor = await driver.cursor(sql, timeout=timeout)
+        records = await cursor.fetch(MAX_ROWS + 1, timeout=timeout)
+    finally:
+        await transaction.rollback()
+    keys = list(records[0].keys()) if records else []
+    return keys, records
+
+
+def _is_statement_timeout(exc: Exception) -> bool:
+    """Whether PostgreSQL cancelled the statement (SQLSTATE 57014)."""
+    if isinstance(exc, asyncpg.QueryCanceledError):
+        return True
+    return getattr(getattr(exc, "orig", None), "sqlstate", None) == "57014"
+
+
+def _unique_keys(keys: Sequence[str]) -> list[str]:
+    """Suffix repeated column names (``id``, ``id_2``) so none is lost in a dict."""
+    seen: set[str] = set()
+    unique = []
+    for key in keys:
+        candidate, n = key, 1
+        while candidate in seen:
+            n += 1
+            candidate = f"{key}_{n}"
+        seen.add(candidate)
+        unique.append(candidate)
+    return unique
+
+
+def _json_lines(
+    keys: Sequence[str], rows: Sequence[Sequence[Any]], truncated: bool
+) -> str:
+    """Render rows as newline-delimited JSON, capped at MAX_OUTPUT_BYTES.
+
+    A row that would cross the cap is dropped whole, however wide it is.
+    """
+    keys = _unique_keys(keys)
+    buffer = bytearray()
+    for row in rows:
+        line = orjson.dumps(
+            dict(zip(keys, row, strict=True)),
+            default=str,
+            option=orjson.OPT_APPEND_NEWLINE,
+        )
+        if len(buffer) + len(line) > MAX_OUTPUT_BYTES:
+            truncated = True
+            break
+        buffer += line
+    if truncated:
+        buffer += b"... (truncated)\n"
+    return buffer.decode()
+
+
+def _tool_safe(fn: Callable[..., Awaitable[str]]) -> Callable[..., Awaitable[str]]:
+    """Default ``schema_name`` to "public" and report errors as tool output."""
+
+    @functools.wraps(fn)
+    async def wrapper(*args: Any, **kwargs: Any) -> str:
+        if "schema_name" in kwargs:
+            kwargs["schema_name"] = kwargs["schema_name"] or "public"
+        try:
+            return await fn(*args, **kwargs)
+        except Exception as e:
+            return _ERR_QUERY.format(e)
+
+    return wrapper
+
+
+def _fast_simple_table(headers: Sequence[str], rows: Sequence[Sequence[Any]]) -> str:
+    """Render rows like tabulate's "simple" format, in a single pass per step.
+
+    None renders as an empty cell; purely numeric columns (including Decimal)
+    are right-aligned. Multi-line cells continue on the following lines.
+    """
+    numeric = [True] * len(headers)
+    cells = []
+    for row in rows:
+        for i, value in enumerate(row):
+            if value is not None and (
+                isinstance(value, bool)
+                or not isinstance(value, (int, float, decimal.Decimal))
+            ):
+                numeric[i] = False
+        cells.append(
+            [[""] if value is None else str(value).split("\n") for value in row]
+        )
+    if not cells:
+        numeric = [False] * len(headers)
+    header_cells = [str(h).split("\n") for h in headers]
+    widths = [
+        max(len(part) for cell in column for part in cell)
+        for column in zip(header_cells, *cells, strict=True)
+    ]
+
+    def lines(values: Sequence[Sequence[str]]) -> list[str]:
+        height = max((len(v) for v in values), default=1)
+        return [
+            "  ".join(
+                f"{part:>{w}}" if num else f"{part:<{w}}"
+                for part, w, num in zip(
+                    (v[k] if k < len(v) else "" for v in values),
+                    widths,
+                    numeric,
+                    strict=True,
+                )
+            )
+            for k in range(height)
+        ]
+
+    out = lines(header_cells)
+    out.append("  ".join("-" * w for w in widths))
+    for row in cells:
+        out.extend(lines(row))
+    return "\n".join(out)
+
+
+def _fmt_list(header: str, items: Sequence[str]) -> str:
+    if OUTPUT_FORMAT == "json":
+        return orjson.dumps({"header": header, "items": items}).decode()
+    return f"{header}: {', '.join(items)}"
+
+
+def _items(
+    headers: Sequence[str], table_data: Sequence[Sequence[Any]]
+) -> list[dict[str, Any]]:
+    return [dict(zip(headers, row, strict=True)) for row in table_data]
+
+
+def _fmt_table(
+    header: str, headers: Sequence[str], table_data: Sequence[Sequence[Any]]
+) -> str:
+    if OUTPUT_FORMAT == "json":
+        items = _items(headers, table_data)
+        return orjson.dumps({"header": header, "items": items}, default=str).decode()
+    return f"{header}\n\n" + _fast_simple_table(headers, table_data)
+
+
+def _render_rows(
+    keys: Sequence[str], rows: Sequence[Sequence[Any]], truncated: bool
+) -> str:
+    if OUTPUT_FORMAT == "json":
+        return _json_lines(keys, rows, truncated)
+    output = _fast_simple_table(keys, rows)
+    if truncated:
+        output += f"\n... (truncated at {MAX_ROWS} rows)"
+    return output
+
+
+def _invalidate_on_schema_change(app_ctx: AppContext, sql: str) -> None:
+    if _SCHEMA_CHANGE_RE.search(sql):
+        app_ctx.metadata_cache.clear()
+
+
+def _column_rows(columns: list[dict[str, Any]]) -> list[list[Any]]:
+    return [
+        [
+            col.get("name"),
+            str(col.get("type")),
+            col.get("nullable"),
+            col.get("autoincrement"),
+            col.get("default"),
+            col.get("comment"),
+        ]
+        for col in columns
+    ]
+
+
+def _index_rows(indexes: list[dict[str, Any]]) -> list[list[Any]]:
+    return [
+        [
+            idx.get("name"),
+            ", ".join(idx.get("column_names", [])),
+            idx.get("unique"),
+        ]
+        for idx in indexes
+    ]
+
+
+def _foreign_key_rows(foreign_keys: list[dict[str, Any]]) -> list[list[Any]]:
+    return [
+        [
+            fk.get("name"),
+            ", ".join(fk.get("constrained_columns", [])),
+            fk.get("referred_schema"),
+            fk.get("referred_table"),
+            ", ".join(fk.get("referred_columns", [])),
+        ]
+        for fk in foreign_keys
+    ]
+
+
+def _columns_section(table: str, columns: list[dict[str, Any]]) -> str:
+    if not columns:
+        return _NO_COLUMNS
+    return _fmt_table(
+        f"Columns for table '{table}'", _HDR_COLUMNS, _column_rows(columns)
+    )
+
+
+def _indexes_section(table: str, indexes: list[dict[str, Any]]) -> str:
+    if not indexes:
+        return _NO_INDEXES
+    return _fmt_table(
+        f"Indexes for table '{table}'", _HDR_INDEXES, _index_rows(indexes)
+    )
+
+
+def _foreign_keys_section(table: str, foreign_keys: list[dict[str, Any]]) -> str:
+    if not foreign_keys:
+        return _NO_FOREIGN_KEYS.format(table)
+    return _fmt_table(
+        f"Foreign keys for table '{table}'",
+        _HDR_FOREIGN_KEYS,
+        _foreign_key_rows(foreign_keys),
+    )
+
+
+def _load_columns(app_ctx: AppContext, schema: str, table: str) -> Awaitable[Any]:
+    return app_ctx.metadata_cache.get_or_load(
+        ("columns", schema, table),
+        lambda: _fetch(app_ctx.engine, _pg_columns, schema, table),
+    )
+
+
+def _load_indexes(app_ctx: AppContext, schema: str, table: str) -> Awaitable[Any]:
+    return app_ctx.metadata_cache.get_or_load(
+        ("indexes", schema, table),
+        lambda: _fetch(app_ctx.engine, _pg_indexes, schema, table),
+    )
+
+
+def _load_foreign_keys(app_ctx: AppContext, schema: str, table: str) -> Awaitable[Any]:
+    return app_ctx.metadata_cache.get_or_load(
+        ("foreign_keys", schema, table),
+        lambda: _fetch(app_ctx.engine, _pg_foreign_keys, schema, table),
+    )
+
+
+def _load_table_comment(app_ctx: AppContext, schema: str, table: str) -> Awaitable[Any]:
+    return app_ctx.metadata_cache.get_or_load(
+        ("table_comment", schema, table),
+        lambda: _fetch(app_ctx.engine, _pg_table_comment, schema, table),
+    )
+
+
+def _load_primary_key(app_ctx: AppContext, schema: str, table: str) -> Awaitable[Any]:
+    return app_ctx.metadata_cache.get_or_load(
+        ("primary_key", schema, table),
+        lambda: _fetch(app_ctx.engine, _pg_primary_key, schema, table),
+    )
+
+
+def _describe_sections(schema: str, table: str, description: dict[str, Any]) -> str:
+    comment = description["comment"].get("text")
+    primary_key = description["primary_key"].get("constrained_columns") or []
+    if OUTPUT_FORMAT == "json":
+        document = {
+            "table": f"{schema}.{table}",
+            "comment": comment,
+            "primary_key": primary_key,
+            "columns": _items(_HDR_COLUMNS, _column_rows(description["columns"])),
+            "indexes": _items(_HDR_INDEXES, _index_rows(description["indexes"])),
+            "foreign_keys": _items(
+                _HDR_FOREIGN_KEYS, _foreign_key_rows(description["foreign_keys"])
+            ),
+        }
+        return orjson.dumps(document, default=str).decode()
+    sections = [
+        f"Table '{schema}.{table}': {comment or 'no comment'}\n"
+        f"Primary key: {', '.join(primary_key) or 'none'}",
+        _columns_section(table, description["columns"]),
+        _indexes_section(table, description["indexes"]),
+        _foreign_keys_section(table, description["foreign_keys"]),
+    ]
+    return "\n\n".join(sections)
+
+
+def _normalize_dsn(dsn: str) -> str:
+    """Point a PostgreSQL DSN at the asyncpg driver.
+
+    Raises ValueError for any other driver, so a DSN can never silently fall
+    back to a slower synchronous one.
+    """
+    match = _DSN_SCHEME_RE.match(dsn)
+    if not match:
+        # Never echo the DSN itself: a key/value DSN carries the password.
+        raise ValueError(
+            "Unsupported DSN: use a postgresql:// or postgresql+asyncpg:// URL."
+        )
+    scheme, rest = match.group(1).lower(), dsn[match.end() :]
+    if scheme not in ("postgresql", "postgres", "postgresql+asyncpg"):
+        raise ValueError(
+            f"Unsupported DSN scheme '{scheme}': use postgresql:// or "
+            "postgresql+asyncpg://."
+        )
+    return "postgresql+asyncpg://" + rest
+
+
+async def _warm_pool(engine: AsyncEngine, size: int) -> None:
+    """Open ``size`` pooled connections up front so early tool calls skip setup.
+
+    Failures are ignored: the server still starts and connects lazily. Every
+    connection that opened is returned to the pool, even when the warm-up is
+    cancelled part-way.
+    """
+    opened: list[AsyncConnection] = []
+
+    async def checkout() -> None:
+        opened.append(await engine.connect().start())
+
+    try:
+        await asyncio.gather(*(checkout() for _ in range(size)), return_exceptions=True)
+    finally:
+        await asyncio.gather(*(c.close() for c in opened), return_exceptions=True)
 
 
 @asynccontextmanager
@@ -22,12 +751,57 @@ async def app_lifespan(server: FastMCP) -> AsyncIterator[AppContext]:
     _dsn = os.getenv("DATABASE_URL")
     if not _dsn:
         raise ValueError("DATABASE_URL environment variable not set.")
-    if _dsn.startswith("postgresql://"):
-        _dsn = _dsn.replace("postgresql://", "postgresql+asyncpg://", 1)
+    _dsn = _normalize_dsn(_dsn)
+
+    server_settings = {
+        # JIT compilation costs more than it saves on short ad-hoc queries.
+        "jit": "off",
+        # Keep idle pooled connections alive through NATs and proxies.
+        "tcp_keepalives_idle": "60",
+        "tcp_keepalives_interval": "10",
+        "tcp_keepalives_count": "5",
+        "application_name": "pgsql-mcp-server",
+        # Server-side limits that free the connection if a query runs away
+        # or a transaction is left open.
+        "statement_timeout": str(STATEMENT_TIMEOUT_MS),
+        "idle_in_transaction_session_timeout": str(IDLE_IN_TRANSACTION_TIMEOUT_MS),
+    }
+    if READ_ONLY:
+        server_settings["default_transaction_read_only"] = "on"
 
-    engine = create_async_engine(_dsn, echo=False)
+    engine = create_async_engine(
+        _dsn,
+        echo=False,
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=POOL_SIZE,
+        max_overflow=POOL_MAX_OVERFLOW,
+        pool_timeout=POOL_TIMEOUT,
+        pool_pre_ping=True,
+        pool_recycle=POOL_RECYCLE,
+        pool_use_lifo=True,
+        # Room for the catalog queries plus repeated user statements.
+        query_cache_size=1200,
+        # The asyncpg dialect registers its json/jsonb codecs with this decoder.
+        json_deserializer=orjson.loads,
+        connect_args={
+            # SQLAlchemy's per-connection cache of asyncpg prepared statements.
+            "prepared_statement_cache_size": 256,
+            # asyncpg's own statement cache for statements it prepares itself.
+            "statement_cache_size": 1024,
+            "command_timeout": _client_timeout(STATEMENT_TIMEOUT_MS),
+            "server_settings": server_settings,
+        },
+    )
 
     try:
+        # The MCP handshake waits on the lifespan, so an unreachable host must
+        # not stall it for asyncpg's 60 s connect timeout.
+        try:
+            await asyncio.wait_for(
+                _warm_pool(engine, min(POOL_MIN_SIZE, POOL_SIZE)), POOL_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            pass
         yield AppContext(engine=engine)
     finally:
         await engine.dispose()
@@ -37,47 +811,43 @@ mcp = FastMCP("PgSQL MCP Server", lifespan=app_lifespan)
 
 
 @mcp.tool()
+@_tool_safe
 async def get_schema_names(ctx: Context) -> str:
     """Get all schema names."""
-    engine = ctx.request_context.lifespan_context.engine
+    app_ctx = ctx.request_context.lifespan_context
 
-    async with engine.connect() as connection:
-        schema_names = await connection.run_sync(
-            lambda sync_conn: inspect(sync_conn).get_schema_names()
-        )
+    schema_names = await app_ctx.metadata_cache.get_or_load(
+        ("schemas",),
+        lambda: _fetch(app_ctx.engine, _pg_schemas),
+    )
     if not schema_names:
-        return "No schemas found."
+        return _NO_SCHEMAS
     else:
-        return f"All schemas: {', '.join(schema_names)}"
+        return _fmt_list("All schemas", schema_names)
 
 
 @mcp.tool()
+@_tool_safe
 async def get_tables(ctx: Context, schema_name: Optional[str] = "public") -> str:
     """Get all tables in a schema.
 
     Args:
         schema_name: The name of the schema to get tables from, defaults to "public".
     """
-    try:
-        schema_name = schema_name or "public"
-        engine = ctx.request_context.lifespan_context.engine
-
-        async with engine.connect() as connection:
-            table_names = await connection.run_sync(
-                lambda sync_conn: inspect(sync_conn).get_table_names(schema=schema_name)
-            )
-        if table_names:
-            table_data = [[name] for name in table_names]
-            headers = [f"Tables in schema '{schema_name}'"]
-            return tabulate(table_data, headers=headers, tablefmt="simple")
-        else:
-            return f"No tables found in schema {schema_name}."
+    app_ctx = ctx.request_context.lifespan_context
 
-    except Exception as e:
-        return f"Error occurred while querying table: {str(e)}"
+    table_names = await app_ctx.metadata_cache.get_or_load(
+        ("tables", schema_name),
+        lambda: _fetch(app_ctx.engine, _pg_tables, schema_name),
+    )
+    if table_names:
+        return _fmt_list(f"Tables in schema '{schema_name}'", table_names)
+    else:
+        return _NO_TABLES.format(schema_name)
 
 
 @mcp.tool()
+@_tool_safe
 async def get_columns(
     ctx: Context, table: str, schema_name: Optional[str] = "public"
 ) -> str:
@@ -87,48 +857,13 @@ async def get_columns(
         table: The name of the table to get columns from.
         schema_name: The name of the schema to get columns from, defaults to "public".
     """
-    try:
-        schema_name = schema_name or "public"
-        engine = ctx.request_context.lifespan_context.engine
-        async with engine.connect() as connection:
-            columns = await connection.run_sync(
-                lambda sync_conn: inspect(sync_conn).get_columns(
-                    table, schema=schema_name
-                )
-            )
-
-        if not columns:
-            return "No columns found in table."
-        else:
-            headers = [
-                "Name",
-                "Type",
-                "Nullable",
-                "Autoincrement",
-                "Default",
-                "Comment",
-            ]
-            table_data = [
-                [
-                    col.get("name"),
-                    str(col.get("type")),
-                    col.get("nullable"),
-                    col.get("autoincrement"),
-                    col.get("default"),
-                    col.get("comment"),
-                ]
-                for col in columns
-            ]
-            table_title = f"Columns for table '{table}'\n\n"
-            return table_title + tabulate(
-                table_data, headers=headers, tablefmt="simple"
-            )
-
-    except Exception as e:
-        return f"Error occurred while querying table: {str(e)}"
+    app_ctx = ctx.request_context.lifespan_context
+    columns = await _load_columns(app_ctx, schema_name, table)
+    return _columns_section(table, columns)
 
 
 @mcp.tool()
+@_tool_safe
 async def get_indexes(
     ctx: Context, table: str, schema_name: Optional[str] = "public"
 ) -> str:
@@ -138,39 +873,13 @@ async def get_indexes(
         table: The name of the table to get indexes from.
         schema_name: The name of the schema to get indexes from, defaults to "public".
     """
-    try:
-        schema_name = schema_name or "public"
-        engine = ctx.request_context.lifespan_context.engine
-
-        async with engine.connect() as connection:
-            indexes = await connection.run_sync(
-                lambda sync_conn: inspect(sync_conn).get_indexes(
-                    table, schema=schema_name
-                )
-            )
-
-        if not indexes:
-            return "No indexes found in table."
-        else:
-            headers = ["Name", "Column Names", "Unique"]
-            table_data = [
-                [
-                    idx.get("name"),
-                    ", ".join(idx.get("column_names", [])),
-                    idx.get("unique"),
-                ]
-                for idx in indexes
-            ]
-            table_title = f"Indexes for table '{table}'\n\n"
-            return table_title + tabulate(
-                table_data, headers=headers, tablefmt="simple"
-            )
-
-    except Exception as e:
-        return f"Error occurred while querying table: {str(e)}"
+    app_ctx = ctx.request_context.lifespan_context
+    indexes = await _load_indexes(app_ctx, schema_name, table)
+    return _indexes_section(table, indexes)
 
 
 @mcp.tool()
+@_tool_safe
 async def get_foreign_keys(
     ctx: Context, table: str, schema_name: Optional[str] = "public"
 ) -> str:
@@ -181,62 +890,136 @@ async def get_foreign_keys(
         schema_name: The name of the schema to get foreign keys from,
             defaults to "public".
     """
-    try:
-        schema_name = schema_name or "public"
-        engine = ctx.request_context.lifespan_context.engine
+    app_ctx = ctx.request_context.lifespan_context
+    foreign_keys = await _load_foreign_keys(app_ctx, schema_name, table)
+    return _foreign_keys_section(table, foreign_keys)
 
-        async with engine.connect() as connection:
-            foreign_keys = await connection.run_sync(
-                lambda sync_conn: inspect(sync_conn).get_foreign_keys(
-                    table, schema=schema_name
-                )
-            )
-        if foreign_keys:
-            headers = [
-                "Name",
-                "Constrained Columns",
-                "Referred Schema",
-                "Referred Table",
-                "Referred Columns",
-            ]
-            table_data = [
-                [
-                    fk.get("name"),
-                    ", ".join(fk.get("constrained_columns", [])),
-                    fk.get("referred_schema"),
-                    fk.get("referred_table"),
-                    ", ".join(fk.get("referred_columns", [])),
-                ]
-                for fk in foreign_keys
-            ]
-            table_title = f"Foreign keys for table '{table}'\n\n"
-            return table_title + tabulate(
-                table_data, headers=headers, tablefmt="simple"
-            )
-        else:
-            return f"No foreign keys found in table {table}."
 
-    except Exception as e:
-        return f"Error occurred while querying table: {str(e)}"
+@mcp.tool()
+@_tool_safe
+async def describe_table(
+    ctx: Context, table: str, schema_name: Optional[str] = "public"
+) -> str:
+    """Describe a table: its comment, columns, indexes and foreign keys.
+
+    Args:
+        table: The name of the table to describe.
+        schema_name: The name of the schema the table is in, defaults to "public".
+    """
+    app_ctx = ctx.request_context.lifespan_context
+
+    description = await app_ctx.metadata_cache.get_or_load(
+        ("table", schema_name, table),
+        lambda: _fetch_table_description(app_ctx.engine, schema_name, table),
+    )
+    return _describe_sections(schema_name, table, description)
+
+
+@mcp.tool()
+@_tool_safe
+async def describe_table_parallel(
+    ctx: Context, table: str, schema_name: Optional[str] = "public"
+) -> str:
+    """Describe a table like describe_table, running each catalog lookup concurrently.
+
+    Faster than describe_table on high-latency links, at the cost of holding
+    several pooled connections at once.
+
+    Args:
+        table: The name of the table to describe.
+        schema_name: The name of the schema the table is in, defaults to "public".
+    """
+    app_ctx = ctx.request_context.lifespan_context
+
+    # An asyncpg connection runs one query at a time, so each lookup gets its
+    # own pooled connection; latency is the slowest lookup, not the sum.
+    columns, indexes, foreign_keys, primary_key, comment = await asyncio.gather(
+        _load_columns(app_ctx, schema_name, table),
+        _load_indexes(app_ctx, schema_name, table),
+        _load_foreign_keys(app_ctx, schema_name, table),
+        _load_primary_key(app_ctx, schema_name, table),
+        _load_table_comment(app_ctx, schema_name, table),
+    )
+    description = {
+        "columns": columns,
+        "indexes": indexes,
+        "foreign_keys": foreign_keys,
+        "primary_key": primary_key,
+        "comment": comment,
+    }
+    return _describe_sections(schema_name, table, description)
+
+
+@mcp.tool()
+@_tool_safe
+async def describe_schema(ctx: Context, schema_name: Optional[str] = "public") -> str:
+    """Summarize every table in a schema: estimated rows, total size and column count.
+
+    Args:
+        schema_name: The name of the schema to describe, defaults to "public".
+    """
+    engine = ctx.request_context.lifespan_context.engine
+
+    async with _catalog_connection(engine) as connection:
+        result = await connection.execute(
+            _SCHEMA_SUMMARY_QUERY, {"schema": schema_name}
+        )
+        table_data = [list(row) for row in result]
+
+    if table_data:
+        return _fmt_table(
+            f"Tables in schema '{schema_name}'", _HDR_SCHEMA_SUMMARY, table_data
+        )
+    else:
+        return _NO_TABLES.format(schema_name)
 
 
 @mcp.tool()
-async def run_dql_query(ctx: Context, raw_dql_sql: str) -> str:
+async def run_dql_query(
+    ctx: Context, raw_dql_sql: str, timeout_ms: Optional[int] = None
+) -> str:
     """Run a raw DQL SQL query, like SELECT, SHOW, DESCRIBE, EXPLAIN, etc.
 
+    At most MCP_MAX_ROWS rows are returned; longer results are truncated.
+    Rows are rendered as a text table, or as one JSON object per line when
+    MCP_OUTPUT is "json".
+    SELECT queries without a LIMIT whose estimated cost exceeds
+    MCP_MAX_QUERY_COST are wrapped in a LIMIT before they run.
+
     Args:
         raw_dql_sql: The raw DQL SQL query to run.
+        timeout_ms: Statement timeout in milliseconds for this query, defaults
+            to PG_STATEMENT_TIMEOUT. 0 disables the server-side timeout; the
+            client then waits as long as it does for the default.
     """
     engine = ctx.request_context.lifespan_context.engine
-    async with AsyncSession(engine) as session:
-        raw_sql_select = text(raw_dql_sql)
-        result: Result = await session.execute(raw_sql_select)
-        keys = result.keys()
-        rows = result.fetchall()
-        if rows:
-            return tabulate(rows, headers=keys, tablefmt="simple")
-        else:
-            return "Query returned no results."
+    statement_timeout_ms = (
+        STATEMENT_TIMEOUT_MS if timeout_ms is None else int(timeout_ms)
+    )
+    if statement_timeout_ms < 0:
+        return _ERR_TIMEOUT_MS
+    client_timeout = _client_timeout(statement_timeout_ms or STATEMENT_TIMEOUT_MS)
+    try:
+        async with engine.connect() as connection:
+            if timeout_ms is not None:
+                # Lasts until this connection's transaction ends.
+                await connection.execute(
+                    _SET_STATEMENT_TIMEOUT, {"ms": str(statement_timeout_ms)}
+                )
+            sql = await _bounded_select(connection, raw_dql_sql)
+            keys, rows = await _fetch_records(connection, sql, client_timeout)
+    except (asyncpg.QueryCanceledError, DBAPIError) as e:
+        if not _is_statement_timeout(e):
+            raise
+        return _ERR_TIMEOUT.format(statement_timeout_ms)
+    except asyncio.TimeoutError:
+        return _ERR_CLIENT_TIMEOUT.format(client_timeout)
+    truncated = len(rows) > MAX_ROWS
+    rows = rows[:MAX_ROWS]
+    if not rows:
+        return _NO_RESULTS
+    # Formatting large results is CPU-bound; keep it off the event loop.
+    return await asyncio.to_thread(_render_rows, keys, rows, truncated)
 
 
 @mcp.tool()
@@ -245,18 +1028,19 @@ async def run_ddl_query(ctx: Context, raw_ddl_sql: str) -> str:
     Args:
         raw_ddl_sql: The raw DDL SQL query to run.
     """
-    engine = ctx.request_context.lifespan_context.engine
-    async with AsyncSession(engine) as session:
-        try:
-            await session.execute(text(raw_ddl_sql))
-            await session.commit()
-            return "DDL query executed successfully."
-        except SQLAlchemyError as e:
-            await session.rollback()
-            return f"Error occurred while executing DDL query: {str(e)}"
-        except Exception as e:
-            await session.rollback()
-            return f"Unexpected error occurred while executing DDL query: {str(e)}"
+    if READ_ONLY:
+        return _ERR_READ_ONLY.format("DDL")
+    app_ctx = ctx.request_context.lifespan_context
+    try:
+        # begin() commits on success and rolls back if the statement fails.
+        async with app_ctx.engine.begin() as connection:
+            await connection.execute(_cached_text(raw_ddl_sql))
+    except SQLAlchemyError as e:
+        return _ERR_EXECUTE.format("DDL", e)
+    except Exception as e:
+        return _ERR_UNEXPECTED.format("DDL", e)
+    _invalidate_on_schema_change(app_ctx, raw_ddl_sql)
+    return "DDL query executed successfully."
 
 
 @mcp.tool()
@@ -265,19 +1049,18 @@ async def run_dml_query(ctx: Context, raw_dml_sql: str) -> str:
     Args:
         raw_dml_sql: The raw DML SQL query to run.
     """
-    engine = ctx.request_context.lifespan_context.engine
-    async with AsyncSession(engine) as session:
-        try:
-            result = await session.execute(text(raw_dml_sql))
-            await session.commit()  # Commit transaction to save changes
-            rowcount = cast(Any, result).rowcount
-            return f"DML query executed successfully. Affected rows: {rowcount}"
-        except SQLAlchemyError as e:
-            await session.rollback()
-            return f"Error occurred while executing DML query: {str(e)}"
-        except Exception as e:
-            await session.rollback()
-            return f"Unexpected error occurred while executing DML query: {str(e)}"
+    if READ_ONLY:
+        return _ERR_READ_ONLY.format("DML")
+    app_ctx = ctx.request_context.lifespan_context
+    try:
+        async with app_ctx.engine.begin() as connection:
+            result = await connection.execute(_cached_text(raw_dml_sql))
+    except SQLAlchemyError as e:
+        return _ERR_EXECUTE.format("DML", e)
+    except Exception as e:
+        return _ERR_UNEXPECTED.format("DML", e)
+    _invalidate_on_schema_change(app_ctx, raw_dml_sql)
+    return f"DML query executed successfully. Affected rows: {result.rowcount}"
 
 
 @mcp.tool()
@@ -286,18 +1069,33 @@ async def run_dcl_query(ctx: Context, raw_dcl_sql: str) -> str:
     Args:
         raw_dcl_sql: The raw DDL SQL query to run.
     """
+    if READ_ONLY:
+        return _ERR_READ_ONLY.format("DCL")
     engine = ctx.request_context.lifespan_context.engine
-    async with AsyncSession(engine) as session:
-        try:
-            await session.execute(text(raw_dcl_sql))
-            await session.commit()
-            return "DCL query executed successfully."
-        except SQLAlchemyError as e:
-            await session.rollback()
-            return f"Error occurred while executing DCL query: {str(e)}"
-        except Exception as e:
-            await session.rollback()
-            return f"Unexpected error occurred while executing DCL query: {str(e)}"
+    try:
+        async with engine.begin() as connection:
+            await connection.execute(_cached_text(raw_dcl_sql))
+    except SQLAlchemyError as e:
+        return _ERR_EXECUTE.format("DCL", e)
+    except Exception as e:
+        return _ERR_UNEXPECTED.format("DCL", e)
+    return "DCL query executed successfully."
+
+
+@mcp.tool()
+async def invalidate_metadata(ctx: Context, schema_name: Optional[str] = None) -> str:
+    """Clear cached schema metadata so the next lookup reads the catalog again.
+
+    Use this after schema changes made outside of this server.
+
+    Args:
+        schema_name: Only clear metadata cached for this schema; clears
+            everything when omitted.
+    """
+    ctx.request_context.lifespan_context.metadata_cache.clear(schema_name)
+    if schema_name:
+        return f"Metadata cache cleared for schema {schema_name}."
+    return "Metadata cache cleared."
 
 
 @click.command()
@@ -305,7 +1103,15 @@ async def run_dcl_query(ctx: Context, raw_dcl_sql: str) -> str:
 def serve(dsn: Optional[str] = None):
     if dsn:
         os.environ["DATABASE_URL"] = dsn
-    mcp.run(transport="stdio")
+    if os.getenv("DATABASE_URL"):
+        try:
+            os.environ["DATABASE_URL"] = _normalize_dsn(os.environ["DATABASE_URL"])
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint="'--dsn' / DATABASE_URL") from e
+    # anyio builds the uvloop loop through its loop factory (asyncio.Runner on
+    # 3.12+) rather than swapping the global event loop policy.
+    use_uvloop = importlib.util.find_spec("uvloop") is not None
+    anyio.run(mcp.run_stdio_async, backend_options={"use_uvloop": use_uvloop})
 
 
 if __name__ == "__main__":
@@ -1,39 +1,76 @@
+import asyncio
+import asyncpg
+import json
+import orjson
 import pytest
+from decimal import Decimal
 from unittest.mock import AsyncMock, MagicMock, patch
 from pgsql_mcp_server.app import (
+    AppContext,
+    MetadataCache,
+    _cached_text,
+    _fast_simple_table,
+    _normalize_dsn,
+    _warm_pool,
+    app_lifespan,
     get_schema_names,
     get_tables,
     get_columns,
     get_indexes,
     get_foreign_keys,
+    describe_schema,
+    describe_table,
+    describe_table_parallel,
     run_dql_query,
     run_ddl_query,
     run_dml_query,
-    run_dcl_query
+    run_dcl_query,
+    invalidate_metadata
 )
 from mcp.server.fastmcp import Context
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 @pytest.fixture
 def mock_context():
     ctx = MagicMock(spec=Context)
     # Mocking the nested structure: ctx.request_context.lifespan_context.engine
     ctx.request_context = MagicMock()
-    ctx.request_context.lifespan_context = MagicMock()
-    ctx.request_context.lifespan_context.engine = MagicMock()
+    ctx.request_context.lifespan_context = AppContext(engine=MagicMock())
     return ctx
 
+@pytest.fixture
+def mock_conn(mock_context):
+    # run_*_query tools use engine.connect() for reads and engine.begin() for writes
+    engine = mock_context.request_context.lifespan_context.engine
+    conn = AsyncMock()
+    engine.connect.return_value.__aenter__.return_value = conn
+    engine.begin.return_value.__aenter__.return_value = conn
+    return conn
+
+@pytest.fixture
+def mock_driver(mock_conn):
+    # run_dql_query reads through the asyncpg connection behind mock_conn
+    driver = MagicMock()
+    driver.transaction.return_value = AsyncMock()
+    driver.cursor = AsyncMock(return_value=MagicMock(fetch=AsyncMock(return_value=[])))
+    mock_conn.get_raw_connection = AsyncMock(
+        return_value=MagicMock(driver_connection=driver)
+    )
+    return driver
+
 @pytest.mark.asyncio
 async def test_get_schema_names(mock_context):
     engine = mock_context.request_context.lifespan_context.engine
     mock_conn = AsyncMock()
     engine.connect.return_value.__aenter__.return_value = mock_conn
     
-    # Mock run_sync for inspect().get_schema_names()
-    mock_conn.run_sync = AsyncMock(return_value=["public", "information_schema"])
+    mock_result = MagicMock()
+    mock_result.scalars.return_value = ["information_schema", "public"]
+    mock_conn.execute = AsyncMock(return_value=mock_result)
     
     result = await get_schema_names(mock_context)
-    assert "All schemas: public, information_schema" in result
-    mock_conn.run_sync.assert_called()
+    assert "All schemas: information_schema, public" in result
+    assert "pg_namespace" in str(mock_conn.execute.call_args.args[0])
 
 @pytest.mark.asyncio
 async def test_get_tables(mock_context):
@@ -41,12 +78,16 @@ async def test_get_tables(mock_context):
     mock_conn = AsyncMock()
     engine.connect.return_value.__aenter__.return_value = mock_conn
     
-    mock_conn.run_sync = AsyncMock(return_value=["users", "orders"])
+    mock_result = MagicMock()
+    mock_result.scalars.return_value = ["users", "orders"]
+    mock_conn.execute = AsyncMock(return_value=mock_result)
     
     result = await get_tables(mock_context, schema_name="public")
     assert "users" in result
     assert "orders" in result
     assert "Tables in schema 'public'" in result
+    # Catalog reads run in autocommit, without a BEGIN/ROLLBACK pair.
+    mock_conn.execution_options.assert_awaited_once_with(isolation_level="AUTOCOMMIT")
 
 @pytest.mark.asyncio
 async def test_get_columns(mock_context):
@@ -58,7 +99,9 @@ async def test_get_columns(mock_context):
         {"name": "id", "type": "INTEGER", "nullable": False, "autoincrement": True, "default": None, "comment": None},
         {"name": "name", "type": "VARCHAR", "nullable": True, "autoincrement": False, "default": None, "comment": None}
     ]
-    mock_conn.run_sync = AsyncMock(return_value=mock_columns)
+    mock_result = MagicMock()
+    mock_result.mappings.return_value = mock_columns
+    mock_conn.execute = AsyncMock(return_value=mock_result)
     
     result = await get_columns(mock_context, table="users")
     assert "id" in result
@@ -66,38 +109,129 @@ async def test_get_columns(mock_context):
     assert "name" in result
     assert "VARCHAR" in result
 
+class FakeRecord(tuple):
+    """Stands in for asyncpg.Record: a tuple that also knows its column names."""
+
+    def __new__(cls, keys, values):
+        record = super().__new__(cls, values)
+        record._keys = keys
+        return record
+
+    def keys(self):
+        return self._keys
+
+def records(keys, *rows):
+    return [FakeRecord(keys, row) for row in rows]
+
 @pytest.mark.asyncio
-async def test_run_dql_query(mock_context):
-    engine = mock_context.request_context.lifespan_context.engine
+async def test_run_dql_query(mock_context, mock_conn, mock_driver):
+    mock_driver.cursor.return_value.fetch.return_value = records(
+        ["id", "name"], (1, "Alice"), (2, "Bob")
+    )
+    mock_plan = MagicMock()
+    mock_plan.scalar.return_value = [{"Plan": {"Total Cost": 10.0}}]
+    mock_conn.exec_driver_sql = AsyncMock(return_value=mock_plan)
     
-    # run_dql_query uses AsyncSession(engine)
-    with patch("pgsql_mcp_server.app.AsyncSession") as mock_session_cls:
-        mock_session = mock_session_cls.return_value.__aenter__.return_value
-        mock_result = MagicMock()
-        mock_result.keys.return_value = ["id", "name"]
-        mock_result.fetchall.return_value = [(1, "Alice"), (2, "Bob")]
-        mock_session.execute = AsyncMock(return_value=mock_result)
-        
+    result = await run_dql_query(mock_context, "SELECT * FROM users")
+    assert "id" in result
+    assert "Alice" in result
+    assert "Bob" in result
+
+@pytest.mark.asyncio
+async def test_run_dql_query_uses_asyncpg_records(
+    mock_context, mock_conn, mock_driver
+):
+    mock_plan = MagicMock()
+    mock_plan.scalar.return_value = [{"Plan": {"Total Cost": 10.0}}]
+    mock_conn.exec_driver_sql = AsyncMock(return_value=mock_plan)
+    cursor = mock_driver.cursor.return_value
+    cursor.fetch.return_value = records(["id", "name"], (1, "Alice"), (2, "Bob"))
+
+    with patch("pgsql_mcp_server.app.MAX_ROWS", 1):
         result = await run_dql_query(mock_context, "SELECT * FROM users")
-        assert "id" in result
-        assert "Alice" in result
-        assert "Bob" in result
+    assert "Alice" in result
+    assert "Bob" not in result
+    assert "truncated at 1 rows" in result
+    cursor.fetch.assert_awaited_once_with(2, timeout=35)
 
 @pytest.mark.asyncio
-async def test_run_dml_query_success(mock_context):
+async def test_run_dql_query_never_commits(mock_context, mock_conn, mock_driver):
+    # No EXPLAIN probe or SET LOCAL runs first, so the cursor's transaction is
+    # the outermost one; it must still be rolled back.
+    mock_driver.cursor.return_value.fetch.return_value = records(
+        ["id", "name"], (1, "Alice")
+    )
+
+    result = await run_dql_query(mock_context, "DELETE FROM users RETURNING *")
+    assert "Alice" in result
+    mock_conn.exec_driver_sql.assert_not_called()
+    mock_conn.execute.assert_not_called()
+    transaction = mock_driver.transaction.return_value
+    transaction.start.assert_awaited_once()
+    transaction.rollback.assert_awaited_once()
+    transaction.commit.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_run_dql_query_statement_timeout(mock_context, mock_conn, mock_driver):
+    mock_plan = MagicMock()
+    mock_plan.scalar.return_value = [{"Plan": {"Total Cost": 10.0}}]
+    mock_conn.exec_driver_sql = AsyncMock(return_value=mock_plan)
+    mock_driver.cursor.side_effect = asyncpg.QueryCanceledError(
+        "canceling statement due to timeout"
+    )
+
+    result = await run_dql_query(mock_context, "SELECT pg_sleep(10)", timeout_ms=500)
+    assert result == "Query cancelled: it exceeded the statement timeout of 500 ms."
+    set_local = mock_conn.execute.call_args_list[0].args
+    assert str(set_local[0]) == "SELECT set_config('statement_timeout', :ms, true)"
+    assert set_local[1] == {"ms": "500"}
+
+@pytest.mark.asyncio
+async def test_run_dql_query_client_timeout_outlasts_statement_timeout(
+    mock_context, mock_conn, mock_driver
+):
+    mock_plan = MagicMock()
+    mock_plan.scalar.return_value = [{"Plan": {"Total Cost": 10.0}}]
+    mock_conn.exec_driver_sql = AsyncMock(return_value=mock_plan)
+    mock_driver.cursor.side_effect = asyncio.TimeoutError()
+
+    result = await run_dql_query(
+        mock_context, "SELECT pg_sleep(90)", timeout_ms=60000
+    )
+    assert result == "Query timed out after 65 s without a response from the server."
+    assert mock_driver.cursor.call_args.kwargs["timeout"] == 65
+
+@pytest.mark.asyncio
+async def test_run_dql_query_timeout_ms_zero_keeps_default_client_timeout(
+    mock_context, mock_conn, mock_driver
+):
+    mock_plan = MagicMock()
+    mock_plan.scalar.return_value = [{"Plan": {"Total Cost": 10.0}}]
+    mock_conn.exec_driver_sql = AsyncMock(return_value=mock_plan)
+    mock_driver.cursor.side_effect = asyncio.TimeoutError()
+
+    result = await run_dql_query(mock_context, "SELECT pg_sleep(90)", timeout_ms=0)
+    assert result == "Query timed out after 35 s without a response from the server."
+    assert mock_conn.execute.call_args_list[0].args[1] == {"ms": "0"}
+
+@pytest.mark.asyncio
+async def test_run_dql_query_rejects_negative_timeout(mock_context, mock_conn):
+    result = await run_dql_query(mock_context, "SELECT 1", timeout_ms=-5)
+    assert result == "timeout_ms must be zero or a positive number of milliseconds."
+    mock_conn.execute.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_run_dml_query_success(mock_context, mock_conn):
     engine = mock_context.request_context.lifespan_context.engine
     
-    with patch("pgsql_mcp_server.app.AsyncSession") as mock_session_cls:
-        mock_session = mock_session_cls.return_value.__aenter__.return_value
-        mock_result = MagicMock()
-        mock_result.rowcount = 1
-        mock_session.execute = AsyncMock(return_value=mock_result)
-        mock_session.commit = AsyncMock()
-        
-        result = await run_dml_query(mock_context, "INSERT INTO users (name) VALUES ('Charlie')")
-        assert "DML query executed successfully" in result
-        assert "Affected rows: 1" in result
-        mock_session.commit.assert_called_once()
+    mock_result = MagicMock()
+    mock_result.rowcount = 1
+    mock_conn.execute = AsyncMock(return_value=mock_result)
+    
+    result = await run_dml_query(mock_context, "INSERT INTO users (name) VALUES ('Charlie')")
+    assert "DML query executed successfully" in result
+    assert "Affected rows: 1" in result
+    engine.begin.assert_called_once()
 
 @pytest.mark.asyncio
 async def test_get_indexes(mock_context):
@@ -108,7 +242,9 @@ async def test_get_indexes(mock_context):
     mock_indexes = [
         {"name": "idx_users_name", "column_names": ["name"], "unique": False}
     ]
-    mock_conn.run_sync = AsyncMock(return_value=mock_indexes)
+    mock_result = MagicMock()
+    mock_result.mappings.return_value = mock_indexes
+    mock_conn.execute = AsyncMock(return_value=mock_result)
     
     result = await get_indexes(mock_context, table="users")
     assert "idx_users_name" in result
@@ -129,7 +265,9 @@ async def test_get_foreign_keys(mock_context):
             "referred_columns": ["id"]
         }
     ]
-    mock_conn.run_sync = AsyncMock(return_value=mock_fks)
+    mock_result = MagicMock()
+    mock_result.mappings.return_value = mock_fks
+    mock_conn.execute = AsyncMock(return_value=mock_result)
     
     result = await get_foreign_keys(mock_context, table="orders")
     assert "fk_orders_user" in result
@@ -137,30 +275,24 @@ async def test_get_foreign_keys(mock_context):
     assert "users" in result
 
 @pytest.mark.asyncio
-async def test_run_ddl_query_success(mock_context):
+async def test_run_ddl_query_success(mock_context, mock_conn):
     engine = mock_context.request_context.lifespan_context.engine
     
-    with patch("pgsql_mcp_server.app.AsyncSession") as mock_session_cls:
-        mock_session = mock_session_cls.return_value.__aenter__.return_value
-        mock_session.execute = AsyncMock()
-        mock_session.commit = AsyncMock()
-        
-        result = await run_ddl_query(mock_context, "CREATE TABLE temp (id INT)")
-        assert "DDL query executed successfully" in result
-        mock_session.commit.assert_called_once()
+    mock_conn.execute = AsyncMock()
+    
+    result = await run_ddl_query(mock_context, "CREATE TABLE temp (id INT)")
+    assert "DDL query executed successfully" in result
+    engine.begin.assert_called_once()
 
 @pytest.mark.asyncio
-async def test_run_dcl_query_success(mock_context):
+async def test_run_dcl_query_success(mock_context, mock_conn):
     engine = mock_context.request_context.lifespan_context.engine
     
-    with patch("pgsql_mcp_server.app.AsyncSession") as mock_session_cls:
-        mock_session = mock_session_cls.return_value.__aenter__.return_value
-        mock_session.execute = AsyncMock()
-        mock_session.commit = AsyncMock()
-        
-        result = await run_dcl_query(mock_context, "GRANT SELECT ON users TO guest")
-        assert "DCL query executed successfully" in result
-        mock_session.commit.assert_called_once()
+    mock_conn.execute = AsyncMock()
+    
+    result = await run_dcl_query(mock_context, "GRANT SELECT ON users TO guest")
+    assert "DCL query executed successfully" in result
+    engine.begin.assert_called_once()
 
 @pytest.mark.asyncio
 async def test_get_tables_error(mock_context):
@@ -171,28 +303,478 @@ async def test_get_tables_error(mock_context):
     assert "Error occurred while querying table: Connection failed" in result
 
 @pytest.mark.asyncio
-async def test_run_dml_query_error(mock_context):
+async def test_run_dml_query_error(mock_context, mock_conn):
     engine = mock_context.request_context.lifespan_context.engine
     
-    with patch("pgsql_mcp_server.app.AsyncSession") as mock_session_cls:
-        mock_session = mock_session_cls.return_value.__aenter__.return_value
-        mock_session.execute = AsyncMock(side_effect=Exception("Execution failed"))
-        mock_session.rollback = AsyncMock()
-        
-        result = await run_dml_query(mock_context, "DELETE FROM users")
-        assert "Unexpected error occurred while executing DML query: Execution failed" in result
-        mock_session.rollback.assert_called_once()
+    mock_conn.execute = AsyncMock(side_effect=Exception("Execution failed"))
+    
+    result = await run_dml_query(mock_context, "DELETE FROM users")
+    assert "Unexpected error occurred while executing DML query: Execution failed" in result
+    engine.begin.return_value.__aexit__.assert_called_once()
 
 @pytest.mark.asyncio
-async def test_run_dql_query_no_results(mock_context):
-    engine = mock_context.request_context.lifespan_context.engine
+async def test_run_dql_query_no_results(mock_context, mock_conn, mock_driver):
+    mock_plan = MagicMock()
+    mock_plan.scalar.return_value = [{"Plan": {"Total Cost": 10.0}}]
+    mock_conn.exec_driver_sql = AsyncMock(return_value=mock_plan)
     
-    with patch("pgsql_mcp_server.app.AsyncSession") as mock_session_cls:
-        mock_session = mock_session_cls.return_value.__aenter__.return_value
-        mock_result = MagicMock()
-        mock_result.keys.return_value = ["id", "name"]
-        mock_result.fetchall.return_value = []
-        mock_session.execute = AsyncMock(return_value=mock_result)
-        
-        result = await run_dql_query(mock_context, "SELECT * FROM users WHERE 1=0")
-        assert "Query returned no results." in result
+    result = await run_dql_query(mock_context, "SELECT * FROM users WHERE 1=0")
+    assert "Query returned no results." in result
+
+@pytest.mark.asyncio
+async def test_get_tables_uses_metadata_cache(mock_context):
+    engine = mock_context.request_context.lifespan_context.engine
+    mock_conn = AsyncMock()
+    engine.connect.return_value.__aenter__.return_value = mock_conn
+    mock_result = MagicMock()
+    mock_result.scalars.return_value = ["users"]
+    mock_conn.execute = AsyncMock(return_value=mock_result)
+
+    await get_tables(mock_context, schema_name="public")
+    result = await get_tables(mock_context, schema_name="public")
+    assert "users" in result
+    assert mock_conn.execute.call_count == 1
+
+    await invalidate_metadata(mock_context)
+    await get_tables(mock_context, schema_name="public")
+    assert mock_conn.execute.call_count == 2
+
+@pytest.mark.asyncio
+async def test_run_ddl_query_invalidates_metadata_cache(mock_context, mock_conn):
+    app_ctx = mock_context.request_context.lifespan_context
+    app_ctx.metadata_cache.entries[("tables", "public")] = (0.0, ["users"])
+
+    mock_conn.execute = AsyncMock()
+
+    await run_ddl_query(mock_context, "DROP TABLE users")
+    assert not app_ctx.metadata_cache.entries
+
+@pytest.mark.asyncio
+async def test_run_dql_query_truncates_at_max_rows(
+    mock_context, mock_conn, mock_driver
+):
+    cursor = mock_driver.cursor.return_value
+    cursor.fetch.return_value = records(["name"], ("Alice",), ("Bob",), ("Carol",))
+    with patch("pgsql_mcp_server.app.MAX_ROWS", 2):
+        mock_plan = MagicMock()
+        mock_plan.scalar.return_value = [{"Plan": {"Total Cost": 10.0}}]
+        mock_conn.exec_driver_sql = AsyncMock(return_value=mock_plan)
+
+        result = await run_dql_query(mock_context, "SELECT name FROM users")
+        assert "Bob" in result
+        assert "Carol" not in result
+        assert "truncated at 2 rows" in result
+        assert cursor.fetch.call_args.args == (3,)
+
+@pytest.mark.asyncio
+async def test_run_dql_query_limits_expensive_select(
+    mock_context, mock_conn, mock_driver
+):
+    mock_driver.cursor.return_value.fetch.return_value = records(["id"], (1,))
+    with patch("pgsql_mcp_server.app.MAX_ROWS", 100):
+        mock_plan = MagicMock()
+        mock_plan.scalar.return_value = [{"Plan": {"Total Cost": 1e9}}]
+        mock_conn.exec_driver_sql = AsyncMock(return_value=mock_plan)
+
+        await run_dql_query(mock_context, "SELECT id FROM events;")
+        executed_sql = mock_driver.cursor.call_args.args[0]
+        assert "SELECT id FROM events" in executed_sql
+        assert executed_sql.endswith("LIMIT 101")
+
+        mock_conn.exec_driver_sql.reset_mock()
+        await run_dql_query(mock_context, "SELECT id FROM events LIMIT 5")
+        mock_conn.exec_driver_sql.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_run_dql_query_explain_keeps_colons_in_literals(
+    mock_context, mock_conn, mock_driver
+):
+    mock_plan = MagicMock()
+    mock_plan.scalar.return_value = [{"Plan": {"Total Cost": 10.0}}]
+    mock_conn.exec_driver_sql = AsyncMock(return_value=mock_plan)
+    sql = """SELECT '{"a":1}'::jsonb"""
+
+    await run_dql_query(mock_context, sql)
+    mock_conn.exec_driver_sql.assert_awaited_once_with(f"EXPLAIN (FORMAT JSON) {sql}")
+    assert mock_driver.cursor.call_args.args[0] == sql
+
+@pytest.mark.asyncio
+async def test_describe_schema(mock_context):
+    engine = mock_context.request_context.lifespan_context.engine
+    mock_conn = AsyncMock()
+    engine.connect.return_value.__aenter__.return_value = mock_conn
+    mock_conn.execute = AsyncMock(
+        return_value=[("orders", 1200, "96 kB", 4), ("users", 50, "16 kB", 2)]
+    )
+
+    result = await describe_schema(mock_context, schema_name="public")
+    assert "Tables in schema 'public'" in result
+    assert "orders" in result
+    assert "96 kB" in result
+    assert mock_conn.execute.call_count == 1
+
+@pytest.mark.asyncio
+async def test_run_dql_query_json_output(mock_context, mock_conn, mock_driver):
+    mock_driver.cursor.return_value.fetch.return_value = records(
+        ["id", "name"], (1, "Alice"), (2, "Bob")
+    )
+    with patch("pgsql_mcp_server.app.OUTPUT_FORMAT", "json"):
+        mock_plan = MagicMock()
+        mock_plan.scalar.return_value = [{"Plan": {"Total Cost": 10.0}}]
+        mock_conn.exec_driver_sql = AsyncMock(return_value=mock_plan)
+
+        result = await run_dql_query(mock_context, "SELECT id, name FROM users")
+        assert result.splitlines() == [
+            '{"id":1,"name":"Alice"}',
+            '{"id":2,"name":"Bob"}',
+        ]
+
+@pytest.mark.asyncio
+async def test_run_dql_query_json_keeps_duplicate_columns(
+    mock_context, mock_conn, mock_driver
+):
+    mock_driver.cursor.return_value.fetch.return_value = records(
+        ["id", "id", "id_2"], (1, 2, 3)
+    )
+    with patch("pgsql_mcp_server.app.OUTPUT_FORMAT", "json"), \
+            patch("pgsql_mcp_server.app.MAX_QUERY_COST", 0):
+        result = await run_dql_query(mock_context, "SELECT a.id, b.id, a.id_2 FROM a, b")
+    assert result.splitlines() == ['{"id":1,"id_2":2,"id_2_2":3}']
+
+@pytest.mark.asyncio
+async def test_run_dql_query_json_caps_wide_rows(mock_context, mock_conn, mock_driver):
+    mock_driver.cursor.return_value.fetch.return_value = records(
+        ["id", "body"], (1, "small"), (2, "x" * 2000), (3, "small")
+    )
+    with patch("pgsql_mcp_server.app.OUTPUT_FORMAT", "json"), \
+            patch("pgsql_mcp_server.app.MAX_QUERY_COST", 0), \
+            patch("pgsql_mcp_server.app.MAX_OUTPUT_BYTES", 1024):
+        result = await run_dql_query(mock_context, "SELECT id, body FROM docs")
+    # The row that would cross the cap is dropped whole.
+    assert result.splitlines() == ['{"id":1,"body":"small"}', "... (truncated)"]
+    assert len(result.encode()) <= 1024 + len("... (truncated)\n")
+
+@pytest.mark.asyncio
+async def test_app_lifespan_engine_options(monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", "postgresql://user@localhost/db")
+    with patch("pgsql_mcp_server.app.create_async_engine") as mock_create:
+        mock_create.return_value.dispose = AsyncMock()
+        warm = mock_create.return_value.connect.return_value
+        warm.start = AsyncMock(return_value=warm)
+        warm.close = AsyncMock()
+        async with app_lifespan(MagicMock()) as app_ctx:
+            assert app_ctx.engine is mock_create.return_value
+            assert warm.close.await_count == 2
+
+    dsn = mock_create.call_args.args[0]
+    kwargs = mock_create.call_args.kwargs
+    assert dsn == "postgresql+asyncpg://user@localhost/db"
+    assert kwargs["poolclass"] is AsyncAdaptedQueuePool
+    assert kwargs["pool_pre_ping"] is True
+    # LIFO keeps traffic on a few hot connections (warm statement caches);
+    # recycling replaces the idle tail before the server drops it.
+    assert kwargs["pool_use_lifo"] is True
+    assert kwargs["pool_recycle"] == 1800
+    assert kwargs["query_cache_size"] == 1200
+    assert kwargs["json_deserializer"] is orjson.loads
+    connect_args = kwargs["connect_args"]
+    assert connect_args["prepared_statement_cache_size"] == 256
+    assert connect_args["statement_cache_size"] == 1024
+    # Leaves room for the server's 30 s statement_timeout to fire first.
+    assert connect_args["command_timeout"] == 35
+    assert connect_args["server_settings"]["jit"] == "off"
+    assert connect_args["server_settings"]["tcp_keepalives_idle"] == "60"
+    assert connect_args["server_settings"]["application_name"] == "pgsql-mcp-server"
+    assert connect_args["server_settings"]["statement_timeout"] == "30000"
+    assert (
+        connect_args["server_settings"]["idle_in_transaction_session_timeout"]
+        == "60000"
+    )
+    assert mock_create.return_value.connect.call_count == 2
+    mock_create.return_value.dispose.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_app_lifespan_starts_when_warmup_fails(monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", "postgresql://user@localhost/db")
+    with patch("pgsql_mcp_server.app.create_async_engine") as mock_create:
+        mock_create.return_value.dispose = AsyncMock()
+        mock_create.return_value.connect.side_effect = OSError("Connection refused")
+        async with app_lifespan(MagicMock()) as app_ctx:
+            assert app_ctx.engine is mock_create.return_value
+
+@pytest.mark.asyncio
+async def test_warm_pool_returns_connections_when_one_fails():
+    engine = MagicMock()
+    ok = MagicMock()
+    ok.start = AsyncMock(return_value=ok)
+    ok.close = AsyncMock()
+    failing = MagicMock()
+    failing.start = AsyncMock(side_effect=OSError("Connection refused"))
+    engine.connect.side_effect = [failing, ok]
+
+    await _warm_pool(engine, 2)
+    ok.close.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_app_lifespan_bounds_warmup(monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", "postgresql://user@localhost/db")
+    ok = MagicMock()
+    ok.start = AsyncMock(return_value=ok)
+    ok.close = AsyncMock()
+    hanging = MagicMock()
+
+    async def never_connects():
+        await asyncio.Event().wait()
+
+    hanging.start = AsyncMock(side_effect=never_connects)
+    with patch("pgsql_mcp_server.app.create_async_engine") as mock_create, \
+            patch("pgsql_mcp_server.app.POOL_TIMEOUT", 0.05):
+        mock_create.return_value.dispose = AsyncMock()
+        mock_create.return_value.connect.side_effect = [ok, hanging]
+
+        async def start():
+            async with app_lifespan(MagicMock()) as app_ctx:
+                assert app_ctx.engine is mock_create.return_value
+
+        await asyncio.wait_for(start(), 5)
+    # The connection that did open is returned despite the timeout.
+    ok.close.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_get_tables_json_output(mock_context):
+    engine = mock_context.request_context.lifespan_context.engine
+    mock_conn = AsyncMock()
+    engine.connect.return_value.__aenter__.return_value = mock_conn
+    mock_result = MagicMock()
+    mock_result.scalars.return_value = ["orders", "users"]
+    mock_conn.execute = AsyncMock(return_value=mock_result)
+
+    with patch("pgsql_mcp_server.app.OUTPUT_FORMAT", "json"):
+        result = await get_tables(mock_context, schema_name="public")
+    assert json.loads(result) == {
+        "header": "Tables in schema 'public'",
+        "items": ["orders", "users"],
+    }
+
+@pytest.mark.asyncio
+async def test_get_columns_defaults_empty_schema_to_public(mock_context):
+    engine = mock_context.request_context.lifespan_context.engine
+    mock_conn = AsyncMock()
+    engine.connect.return_value.__aenter__.return_value = mock_conn
+    mock_result = MagicMock()
+    mock_result.mappings.return_value = [{"name": "id", "type": "integer"}]
+    mock_conn.execute = AsyncMock(return_value=mock_result)
+
+    await get_columns(mock_context, table="users", schema_name=None)
+    params = mock_conn.execute.call_args.args[1]
+    assert params == {"schema": "public", "table": "users"}
+
+def catalog_results(
+    columns=(), indexes=(), foreign_keys=(), primary_key=None, comment=None
+):
+    """Answer each pg_catalog query by a snippet of its SQL."""
+    results = {}
+    for snippet, rows in (
+        ("format_type", columns),
+        ("pg_index ix", indexes),
+        ("contype = 'f'", foreign_keys),
+    ):
+        results[snippet] = MagicMock()
+        results[snippet].mappings.return_value = list(rows)
+    results["contype = 'p'"] = MagicMock()
+    results["contype = 'p'"].mappings.return_value.first.return_value = primary_key
+    results["obj_description"] = MagicMock()
+    results["obj_description"].scalar.return_value = comment
+
+    async def execute(statement, params=None):
+        sql = str(statement)
+        return next(r for snippet, r in results.items() if snippet in sql)
+
+    return execute
+
+@pytest.mark.asyncio
+async def test_describe_table(mock_context):
+    engine = mock_context.request_context.lifespan_context.engine
+    mock_conn = AsyncMock()
+    engine.connect.return_value.__aenter__.return_value = mock_conn
+    mock_conn.execute = AsyncMock(side_effect=catalog_results(
+        columns=[{"name": "user_id", "type": "integer"}],
+        indexes=[
+            {"name": "idx_orders_user", "column_names": ["user_id"], "unique": False}
+        ],
+        foreign_keys=[
+            {
+                "name": "fk_orders_user",
+                "constrained_columns": ["user_id"],
+                "referred_schema": "public",
+                "referred_table": "users",
+                "referred_columns": ["id"]
+            }
+        ],
+        primary_key={"name": "orders_pkey", "constrained_columns": ["id"]},
+        comment="Customer orders",
+    ))
+
+    result = await describe_table(mock_context, table="orders")
+    assert "Table 'public.orders': Customer orders" in result
+    assert "Primary key: id" in result
+    assert "Columns for table 'orders'" in result
+    assert "idx_orders_user" in result
+    assert "fk_orders_user" in result
+    # Every catalog lookup shares one connection checkout.
+    engine.connect.assert_called_once()
+    assert mock_conn.execute.await_count == 5
+    mock_conn.run_sync.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_describe_table_parallel(mock_context):
+    engine = mock_context.request_context.lifespan_context.engine
+    mock_conn = AsyncMock()
+    engine.connect.return_value.__aenter__.return_value = mock_conn
+    mock_conn.execute = AsyncMock(side_effect=catalog_results(
+        columns=[{"name": "user_id", "type": "integer"}],
+        indexes=[
+            {"name": "idx_orders_user", "column_names": ["user_id"], "unique": False}
+        ],
+        primary_key={"name": "orders_pkey", "constrained_columns": ["id"]},
+    ))
+
+    result = await describe_table_parallel(mock_context, table="orders")
+    assert "Table 'public.orders': no comment" in result
+    assert "Primary key: id" in result
+    assert "idx_orders_user" in result
+    assert "No foreign keys found in table orders." in result
+    # Each lookup checks out its own connection.
+    assert engine.connect.call_count == 5
+
+@pytest.mark.asyncio
+async def test_describe_table_json_output(mock_context):
+    engine = mock_context.request_context.lifespan_context.engine
+    mock_conn = AsyncMock()
+    engine.connect.return_value.__aenter__.return_value = mock_conn
+    mock_conn.execute = AsyncMock(side_effect=catalog_results(
+        columns=[{"name": "user_id", "type": "integer", "nullable": False}],
+        primary_key={"name": "orders_pkey", "constrained_columns": ["id"]},
+        comment="Customer orders",
+    ))
+
+    with patch("pgsql_mcp_server.app.OUTPUT_FORMAT", "json"):
+        result = await describe_table(mock_context, table="orders")
+    document = json.loads(result)
+    assert document["table"] == "public.orders"
+    assert document["comment"] == "Customer orders"
+    assert document["primary_key"] == ["id"]
+    assert document["columns"][0]["Name"] == "user_id"
+    assert document["columns"][0]["Nullable"] is False
+    assert document["indexes"] == []
+    assert document["foreign_keys"] == []
+
+@pytest.mark.asyncio
+async def test_write_queries_rejected_in_read_only_mode(mock_context):
+    engine = mock_context.request_context.lifespan_context.engine
+    with patch("pgsql_mcp_server.app.READ_ONLY", True):
+        ddl = await run_ddl_query(mock_context, "DROP TABLE users")
+        dml = await run_dml_query(mock_context, "DELETE FROM users")
+        dcl = await run_dcl_query(mock_context, "GRANT SELECT ON users TO guest")
+    assert "DDL queries are disabled" in ddl
+    assert "DML queries are disabled" in dml
+    assert "DCL queries are disabled" in dcl
+    engine.begin.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_metadata_cache_single_flight():
+    cache = MetadataCache(ttl=60)
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0)
+        return ["users"]
+
+    results = await asyncio.gather(
+        *(cache.get_or_load(("tables", "public"), loader) for _ in range(5))
+    )
+    assert results == [["users"]] * 5
+    assert calls == 1
+    assert not cache.locks
+
+@pytest.mark.asyncio
+async def test_metadata_cache_evicts_expired_entries():
+    cache = MetadataCache(ttl=60)
+
+    async def loader():
+        return []
+
+    with patch("pgsql_mcp_server.app.time.monotonic", return_value=0.0):
+        await cache.get_or_load(("columns", "public", "usres"), loader)
+    with patch("pgsql_mcp_server.app.time.monotonic", return_value=100.0):
+        await cache.get_or_load(("columns", "public", "users"), loader)
+    assert set(cache.entries) == {("columns", "public", "users")}
+    assert not cache.locks
+
+@pytest.mark.asyncio
+async def test_metadata_cache_clear_during_load_is_not_overwritten():
+    cache = MetadataCache(ttl=60)
+
+    async def loader():
+        cache.clear()
+        return ["stale"]
+
+    assert await cache.get_or_load(("tables", "public"), loader) == ["stale"]
+    assert ("tables", "public") not in cache.entries
+
+@pytest.mark.asyncio
+async def test_invalidate_metadata_for_one_schema(mock_context):
+    cache = mock_context.request_context.lifespan_context.metadata_cache
+    cache.entries[("tables", "public")] = (float("inf"), ["users"])
+    cache.entries[("tables", "audit")] = (float("inf"), ["events"])
+    cache.entries[("schemas",)] = (float("inf"), ["public", "audit"])
+
+    result = await invalidate_metadata(mock_context, schema_name="audit")
+    assert "audit" in result
+    assert set(cache.entries) == {("tables", "public"), ("schemas",)}
+
+def test_fast_simple_table():
+    output = _fast_simple_table(["id", "name"], [(1, "Alice"), (22, None)])
+    assert output.splitlines() == [
+        "id  name ",
+        "--  -----",
+        " 1  Alice",
+        "22       ",
+    ]
+
+def test_fast_simple_table_right_aligns_decimals():
+    output = _fast_simple_table(["n"], [(Decimal("1.5"),), (Decimal("10"),)])
+    assert output.splitlines() == ["  n", "---", "1.5", " 10"]
+
+def test_fast_simple_table_splits_multiline_cells():
+    output = _fast_simple_table(["a", "b"], [("x\ny", 1), ("zz", 22)])
+    assert output.splitlines() == [
+        "a    b",
+        "--  --",
+        "x    1",
+        "y     ",
+        "zz  22",
+    ]
+
+def test_normalize_dsn():
+    assert _normalize_dsn("postgresql://u@h/db") == "postgresql+asyncpg://u@h/db"
+    assert _normalize_dsn("postgres://u@h/db") == "postgresql+asyncpg://u@h/db"
+    assert _normalize_dsn("postgresql+asyncpg://u@h/db") == "postgresql+asyncpg://u@h/db"
+    with pytest.raises(ValueError, match="postgresql\\+psycopg2"):
+        _normalize_dsn("postgresql+psycopg2://u:secret@h/db")
+    assert _normalize_dsn("POSTGRESQL://u@h/db") == "postgresql+asyncpg://u@h/db"
+    for dsn in (
+        "host=db user=app password=hunter2 dbname=x",
+        "postgresql+asyncpg:/u:hunter2@h/db",
+        "host=db password=hunter2://x",
+    ):
+        with pytest.raises(ValueError) as excinfo:
+            _normalize_dsn(dsn)
+        assert "hunter2" not in str(excinfo.value)
+
+def test_cached_text_reuses_small_statements():
+    assert _cached_text("SELECT 1") is _cached_text("SELECT 1")
+    big = "SELECT " + "1, " * 2000 + "1"
+    assert _cached_text(big) is not _cached_text(big)